@@ -7,7 +7,10 @@ Usage:
   echo "PASSWORD" | python3 vnc-control.py HOST PORT ACTION [PARAMS...]
 
 Actions:
-  screenshot [OUTPUT_FILE]   - Capture framebuffer (default: base64 to stdout)
+  screenshot [OUTPUT_FILE]   - Capture framebuffer (default: base64 JPEG to stdout;
+                               OUTPUT_FILE is PNG unless it ends in .jpg/.jpeg).
+                               Without PIL, prints the raw framebuffer as base64:
+                               little-endian RGB565, or BGRX with OUTPUT_FILE
   click X Y                  - Left click at (X, Y)
   doubleclick X Y            - Double left click
   rightclick X Y             - Right click
@@ -18,19 +21,25 @@ Actions:
   move X Y                   - Move mouse to (X, Y)
   drag X1 Y1 X2 Y2           - Drag from (X1,Y1) to (X2,Y2)
   screensize                 - Get screen dimensions
+
+PNG screenshots are saved with zlib level 1 by default; set
+JARVIS_VNC_PNG_COMPRESS_LEVEL (0-9) to trade CPU for size.
+
+Framebuffers are requested Raw, the fastest on loopback or a LAN; set
+JARVIS_VNC_ENCODING=zrle (or hextile) to save bandwidth on slow links.
 """
 
 import sys
-import socket
 import struct
 import time
 import io
 import base64
 
-try:
-    from PIL import Image
-except ImportError:
-    Image = None
+from vnc_core import RFBConnection, framebuffer_to_image, save_image
+
+# RFB client input messages: PointerEvent (type 5) and KeyEvent (type 4)
+_POINTER = struct.Struct('>BBHH')
+_KEY = struct.Struct('>BBxxI')
 
 # Key symbol mappings (X11 keysyms used by VNC/RFB)
 KEYSYM_MAP = {
@@ -58,89 +67,27 @@ KEYSYM_MAP = {
 }
 
 
-def vnc_des_encrypt(key_bytes, challenge):
-    try:
-        from Crypto.Cipher import DES
-    except ImportError:
-        from Cryptodome.Cipher import DES
-    reversed_key = bytes(int('{:08b}'.format(b)[::-1], 2) for b in key_bytes)
-    cipher = DES.new(reversed_key, DES.MODE_ECB)
-    return cipher.encrypt(challenge)
-
-
-class VNCConnection:
-    def __init__(self, host, port, password):
-        self.host = host
-        self.port = port
-        self.password = password
-        self.sock = None
-        self.width = 0
-        self.height = 0
-        self.name = ''
-
-    def connect(self):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.settimeout(15)
-        self.sock.connect((self.host, self.port))
-
-        # Protocol version
-        server_version = self.sock.recv(12)
-        self.sock.send(b'RFB 003.008\n')
-
-        # Security types
-        num_types = struct.unpack('B', self.sock.recv(1))[0]
-        if num_types == 0:
-            err_len = struct.unpack('>I', self.sock.recv(4))[0]
-            err_msg = self.sock.recv(err_len).decode('utf-8', errors='replace')
-            raise Exception(f"VNC error: {err_msg}")
-
-        security_types = list(self.sock.recv(num_types))
-
-        if 2 in security_types:
-            self.sock.send(struct.pack('B', 2))
-            challenge = self.sock.recv(16)
-            key = (self.password.encode('utf-8') + b'\x00' * 8)[:8]
-            response = vnc_des_encrypt(key, challenge[:8]) + vnc_des_encrypt(key, challenge[8:16])
-            self.sock.send(response)
-            auth_result = struct.unpack('>I', self.sock.recv(4))[0]
-            if auth_result != 0:
-                raise Exception("VNC authentication failed")
-        elif 1 in security_types:
-            self.sock.send(struct.pack('B', 1))
-        else:
-            raise Exception(f"No supported security type: {security_types}")
-
-        # Client init
-        self.sock.send(struct.pack('B', 1))
-
-        # Server init
-        server_init = self.sock.recv(24)
-        self.width, self.height = struct.unpack('>HH', server_init[:4])
-        name_len = struct.unpack('>I', server_init[20:24])[0]
-        self.name = self.sock.recv(name_len).decode('utf-8', errors='replace')
-
-    def close(self):
-        if self.sock:
-            self.sock.close()
-
-    def recv_exact(self, n):
-        data = b''
-        while len(data) < n:
-            chunk = self.sock.recv(min(n - len(data), 65536))
-            if not chunk:
-                raise Exception("Connection closed")
-            data += chunk
-        return data
+def keysym_for(name):
+    """Resolve a key name to its X11 keysym, or None if unknown.
+
+    Single characters are their own keysym (Latin-1 keysyms equal the code
+    point), so they skip the KEYSYM_MAP lookup entirely.
+    """
+    if len(name) == 1:
+        return ord(name)
+    return KEYSYM_MAP.get(name.lower())
+
+
+class VNCConnection(RFBConnection):
+    """RFB connection with mouse/keyboard input and screenshot helpers."""
 
     def send_pointer_event(self, x, y, button_mask=0):
         """RFB PointerEvent: msg_type=5, button_mask, x, y"""
-        msg = struct.pack('>BBHH', 5, button_mask, x, y)
-        self.sock.send(msg)
+        self.sock.sendall(_POINTER.pack(5, button_mask, x, y))
 
     def send_key_event(self, key, down=True):
         """RFB KeyEvent: msg_type=4, down_flag, padding, key"""
-        msg = struct.pack('>BBxxI', 4, 1 if down else 0, key)
-        self.sock.send(msg)
+        self.sock.sendall(_KEY.pack(4, 1 if down else 0, key))
 
     def click(self, x, y, button=1):
         """Click at position. button: 1=left, 2=middle, 4=right"""
@@ -169,55 +116,54 @@ class VNCConnection:
         time.sleep(0.02)
         self.send_pointer_event(x1, y1, 1)  # press
         time.sleep(0.05)
+        # Send the whole motion path in one write
+        path = bytearray()
         for i in range(1, steps + 1):
             t = i / steps
             x = int(x1 + (x2 - x1) * t)
             y = int(y1 + (y2 - y1) * t)
-            self.send_pointer_event(x, y, 1)
-            time.sleep(0.02)
+            path += _POINTER.pack(5, 1, x, y)
+        self.sock.sendall(path)
+        time.sleep(0.05)
         self.send_pointer_event(x2, y2, 0)  # release
 
-    def type_text(self, text):
-        for ch in text:
+    def type_text(self, text, chunk_chars=64):
+        """Type text by pipelining key down/up events; RFB is ordered over TCP."""
+        buf = bytearray()
+        for i, ch in enumerate(text, 1):
             keysym = ord(ch)
-            self.send_key_event(keysym, True)
-            self.send_key_event(keysym, False)
-            time.sleep(0.02)
+            buf += _KEY.pack(4, 1, keysym)
+            buf += _KEY.pack(4, 0, keysym)
+            if i % chunk_chars == 0:
+                self.sock.sendall(buf)
+                buf.clear()
+                time.sleep(0.001)  # brief pacing for servers with small input queues
+        if buf:
+            self.sock.sendall(buf)
 
     def press_key(self, key_name):
-        keysym = KEYSYM_MAP.get(key_name.lower())
+        keysym = keysym_for(key_name)
         if keysym is None:
-            if len(key_name) == 1:
-                keysym = ord(key_name)
-            else:
-                raise ValueError(f"Unknown key: {key_name}")
+            raise ValueError(f"Unknown key: {key_name}")
         self.send_key_event(keysym, True)
         time.sleep(0.05)
         self.send_key_event(keysym, False)
 
     def key_combo(self, combo):
         """Press a key combo like 'cmd+c', 'ctrl+shift+a'"""
-        parts = combo.lower().split('+')
         keys = []
-        for part in parts:
+        for part in combo.lower().split('+'):
             part = part.strip()
-            keysym = KEYSYM_MAP.get(part)
+            keysym = keysym_for(part)
             if keysym is None:
-                if len(part) == 1:
-                    keysym = ord(part)
-                else:
-                    raise ValueError(f"Unknown key in combo: {part}")
+                raise ValueError(f"Unknown key in combo: {part}")
             keys.append(keysym)
 
-        # Press all keys down
-        for k in keys:
-            self.send_key_event(k, True)
-            time.sleep(0.02)
+        # Press all keys down (in order, so modifiers land first)
+        self.sock.sendall(b''.join(_KEY.pack(4, 1, k) for k in keys))
         time.sleep(0.05)
         # Release in reverse order
-        for k in reversed(keys):
-            self.send_key_event(k, False)
-            time.sleep(0.02)
+        self.sock.sendall(b''.join(_KEY.pack(4, 0, k) for k in reversed(keys)))
 
     def scroll(self, direction, amount=3, x=None, y=None):
         """Scroll using VNC scroll buttons (4=up, 5=down, 6=left, 7=right)"""
@@ -236,76 +182,31 @@ class VNCConnection:
 
     def capture_screenshot(self, output_file=None):
         """Capture framebuffer as PNG."""
-        # Set pixel format
-        pixel_format = struct.pack('>BBBBHHHBBBxxx',
-            32, 24, 0, 1, 255, 255, 255, 16, 8, 0)
-        msg = struct.pack('>Bxxx', 0) + pixel_format
-        self.sock.send(msg)
-
-        # Set encodings (Raw only)
-        msg = struct.pack('>BxH', 2, 1) + struct.pack('>i', 0)
-        self.sock.send(msg)
-
-        # Request framebuffer
-        msg = struct.pack('>BBHHHH', 3, 0, 0, 0, self.width, self.height)
-        self.sock.send(msg)
-
-        # Receive framebuffer
-        framebuffer = bytearray(self.width * self.height * 4)
-
-        while True:
-            msg_type = struct.unpack('B', self.recv_exact(1))[0]
-            if msg_type == 0:
-                _ = self.recv_exact(1)
-                num_rects = struct.unpack('>H', self.recv_exact(2))[0]
-                for _ in range(num_rects):
-                    rx, ry, rw, rh, encoding = struct.unpack('>HHHHi', self.recv_exact(12))
-                    if encoding == 0:
-                        rect_data = self.recv_exact(rw * rh * 4)
-                        for row in range(rh):
-                            src_off = row * rw * 4
-                            dst_off = ((ry + row) * self.width + rx) * 4
-                            framebuffer[dst_off:dst_off + rw * 4] = rect_data[src_off:src_off + rw * 4]
-                break
-            elif msg_type == 1:
-                _ = self.recv_exact(1)
-                first = struct.unpack('>H', self.recv_exact(2))[0]
-                num = struct.unpack('>H', self.recv_exact(2))[0]
-                _ = self.recv_exact(num * 6)
-            elif msg_type == 2:
-                pass
-            elif msg_type == 3:
-                _ = self.recv_exact(3)
-                tl = struct.unpack('>I', self.recv_exact(4))[0]
-                _ = self.recv_exact(tl)
-            else:
-                break
-
-        if Image:
-            rgba = bytearray(len(framebuffer))
-            for i in range(0, len(framebuffer), 4):
-                rgba[i] = framebuffer[i + 2]
-                rgba[i + 1] = framebuffer[i + 1]
-                rgba[i + 2] = framebuffer[i]
-                rgba[i + 3] = 255
-            img = Image.frombytes('RGBA', (self.width, self.height), bytes(rgba))
+        to_file = output_file and output_file != '-b64'
+        # RGB565 halves the transfer for the base64 JPEG, which is downscaled
+        # and lossy anyway; files keep full colour depth
+        bpp = 32 if to_file else 16
+        framebuffer = self.read_framebuffer(bpp=bpp)
+
+        img = framebuffer_to_image(framebuffer, self.width, self.height, bpp=bpp)
+        if img is not None:
             # Resize to max 768px wide for context-friendly base64 output
             max_w = 768
             if img.width > max_w:
+                from PIL import Image
                 ratio = max_w / img.width
                 new_h = int(img.height * ratio)
                 img = img.resize((max_w, new_h), Image.LANCZOS)
-            if output_file and output_file != '-b64':
-                img.save(output_file, 'PNG')
+            if to_file:
+                save_image(img, output_file, output_file)
                 return f"OK:{self.width}x{self.height}"
             else:
-                # Convert RGBA→RGB and save as JPEG for much smaller base64
-                rgb = img.convert('RGB')
+                # Save as JPEG for much smaller base64
                 buf = io.BytesIO()
-                rgb.save(buf, 'JPEG', quality=60, optimize=True)
+                img.save(buf, 'JPEG', quality=60, optimize=True)
                 return base64.b64encode(buf.getvalue()).decode('ascii')
 
-        return base64.b64encode(bytes(framebuffer)).decode('ascii')
+        return base64.b64encode(framebuffer).decode('ascii')
 
 
 def main():
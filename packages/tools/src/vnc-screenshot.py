@@ -9,207 +9,81 @@ Usage:
 
 If OUTPUT_FILE is not provided, outputs base64 to stdout.
 If OUTPUT_FILE is "-b64", outputs base64 to stdout.
+If OUTPUT_FILE ends in .jpg/.jpeg, it is written as JPEG instead of PNG.
+
+PNGs are saved with zlib level 1 by default; set JARVIS_VNC_PNG_COMPRESS_LEVEL
+(0-9) to trade CPU for size.
+
+The framebuffer is requested Raw, the fastest on loopback or a LAN; set
+JARVIS_VNC_ENCODING=zrle (or hextile) to save bandwidth on slow links.
 """
 
 import sys
-import socket
-import struct
-import hashlib
 import io
 import base64
 
-try:
-    from PIL import Image
-except ImportError:
-    # Fallback: output raw BMP-like data
-    Image = None
+from vnc_core import RFBConnection, framebuffer_to_image, save_image
 
-# DES encryption for VNC auth
-def vnc_des_encrypt(key_bytes, challenge):
-    """VNC uses a modified DES where bits in each byte are reversed."""
-    try:
-        from Crypto.Cipher import DES
-    except ImportError:
-        try:
-            from Cryptodome.Cipher import DES
-        except ImportError:
-            # Minimal DES implementation for VNC
-            raise ImportError("Need pycryptodome: pip3 install pycryptodome")
-
-    # VNC reverses bits in each byte of the key
-    reversed_key = bytes(
-        int('{:08b}'.format(b)[::-1], 2) for b in key_bytes
-    )
-    cipher = DES.new(reversed_key, DES.MODE_ECB)
-    return cipher.encrypt(challenge)
 
+class Base64Writer(io.RawIOBase):
+    """Write-only stream that base64-encodes into another binary stream as data arrives.
 
-def capture_vnc_screenshot(host, port, password, output_file=None):
-    """Connect to VNC server, authenticate, and capture framebuffer."""
+    Bytes are held back until they form a multiple of 3, so the output is
+    identical to base64-encoding the whole payload at once.
+    """
 
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(15)
-    sock.connect((host, port))
-
-    # 1. Protocol version handshake
-    server_version = sock.recv(12)
-    # Send our version (3.8)
-    sock.send(b'RFB 003.008\n')
-
-    # 2. Security types
-    num_types = struct.unpack('B', sock.recv(1))[0]
-    if num_types == 0:
-        # Error
-        err_len = struct.unpack('>I', sock.recv(4))[0]
-        err_msg = sock.recv(err_len).decode('utf-8', errors='replace')
-        raise Exception(f"VNC error: {err_msg}")
-
-    security_types = list(sock.recv(num_types))
-
-    # Prefer VNCAuth (type 2)
-    if 2 in security_types:
-        sock.send(struct.pack('B', 2))
-
-        # VNC authentication
-        challenge = sock.recv(16)
-
-        # Pad/truncate password to 8 bytes
-        key = (password.encode('utf-8') + b'\x00' * 8)[:8]
-
-        # Encrypt challenge with DES
-        response = vnc_des_encrypt(key, challenge[:8]) + vnc_des_encrypt(key, challenge[8:16])
-        sock.send(response)
-
-        # Check auth result
-        auth_result = struct.unpack('>I', sock.recv(4))[0]
-        if auth_result != 0:
-            raise Exception(f"VNC authentication failed (result: {auth_result})")
-    elif 1 in security_types:
-        # No auth
-        sock.send(struct.pack('B', 1))
-    else:
-        raise Exception(f"No supported security type (offered: {security_types})")
-
-    # 3. Client init (shared flag = 1)
-    sock.send(struct.pack('B', 1))
-
-    # 4. Server init
-    server_init = sock.recv(24)
-    width, height = struct.unpack('>HH', server_init[:4])
-    bpp, depth, big_endian, true_color = struct.unpack('BBBB', server_init[4:8])
-    r_max, g_max, b_max = struct.unpack('>HHH', server_init[8:14])
-    r_shift, g_shift, b_shift = struct.unpack('BBB', server_init[14:17])
-    # Padding
-    _ = server_init[17:20]
-    name_len = struct.unpack('>I', server_init[20:24])[0]
-    name = sock.recv(name_len).decode('utf-8', errors='replace')
-
-    sys.stderr.write(f"VNC: {name} {width}x{height} bpp={bpp}\n")
-
-    # 5. Set pixel format (request 32bpp BGRA for simplicity)
-    pixel_format = struct.pack('>BBBBHHHBBBxxx',
-        32,   # bits per pixel
-        24,   # depth
-        0,    # big-endian (0 = little)
-        1,    # true color
-        255,  # red max
-        255,  # green max
-        255,  # blue max
-        16,   # red shift
-        8,    # green shift
-        0,    # blue shift
-    )
-    msg = struct.pack('>Bxxx', 0) + pixel_format  # SetPixelFormat
-    sock.send(msg)
-
-    # 6. Set encodings (prefer Raw = 0)
-    msg = struct.pack('>BxH', 2, 1)  # SetEncodings, 1 encoding
-    msg += struct.pack('>i', 0)  # Raw encoding
-    sock.send(msg)
-
-    # 7. Request full framebuffer update
-    msg = struct.pack('>BBHHHH', 3, 0, 0, 0, width, height)  # FramebufferUpdateRequest
-    sock.send(msg)
-
-    # 8. Receive framebuffer update
-    framebuffer = bytearray(width * height * 4)  # BGRA
-
-    def recv_exact(n):
-        data = b''
-        while len(data) < n:
-            chunk = sock.recv(min(n - len(data), 65536))
-            if not chunk:
-                raise Exception("Connection closed")
-            data += chunk
-        return data
-
-    while True:
-        msg_type = struct.unpack('B', recv_exact(1))[0]
-
-        if msg_type == 0:  # FramebufferUpdate
-            _ = recv_exact(1)  # padding
-            num_rects = struct.unpack('>H', recv_exact(2))[0]
-
-            for _ in range(num_rects):
-                rx, ry, rw, rh, encoding = struct.unpack('>HHHHi', recv_exact(12))
-
-                if encoding == 0:  # Raw
-                    rect_data = recv_exact(rw * rh * 4)
-                    # Copy rect data into framebuffer
-                    for row in range(rh):
-                        src_offset = row * rw * 4
-                        dst_offset = ((ry + row) * width + rx) * 4
-                        framebuffer[dst_offset:dst_offset + rw * 4] = rect_data[src_offset:src_offset + rw * 4]
-                else:
-                    sys.stderr.write(f"Unsupported encoding: {encoding}\n")
-                    break
-
-            break  # Got the framebuffer
-
-        elif msg_type == 1:  # SetColorMapEntries
-            _ = recv_exact(1)  # padding
-            first_color = struct.unpack('>H', recv_exact(2))[0]
-            num_colors = struct.unpack('>H', recv_exact(2))[0]
-            _ = recv_exact(num_colors * 6)  # RGB values
-
-        elif msg_type == 2:  # Bell
-            pass
-
-        elif msg_type == 3:  # ServerCutText
-            _ = recv_exact(3)  # padding
-            text_len = struct.unpack('>I', recv_exact(4))[0]
-            _ = recv_exact(text_len)
+    def __init__(self, out):
+        self._out = out
+        self._pending = b''
 
-        else:
-            sys.stderr.write(f"Unknown message type: {msg_type}\n")
-            break
+    def writable(self):
+        return True
+
+    def write(self, data):
+        chunk = self._pending + bytes(data)
+        aligned = len(chunk) - len(chunk) % 3
+        if aligned:
+            self._out.write(base64.b64encode(chunk[:aligned]))
+        self._pending = chunk[aligned:]
+        return len(data)
+
+    def finish(self):
+        """Encode the final partial group (with padding)."""
+        self._out.write(base64.b64encode(self._pending))
+        self._pending = b''
 
-    sock.close()
 
-    # Convert BGRA framebuffer to PNG
-    if Image:
-        # Convert BGRA to RGBA
-        rgba_data = bytearray(len(framebuffer))
-        for i in range(0, len(framebuffer), 4):
-            rgba_data[i] = framebuffer[i + 2]      # R <- B
-            rgba_data[i + 1] = framebuffer[i + 1]  # G
-            rgba_data[i + 2] = framebuffer[i]       # B <- R
-            rgba_data[i + 3] = 255                   # A
+def capture_vnc_screenshot(host, port, password, output_file=None):
+    """Connect to VNC server, authenticate, and capture framebuffer."""
+    vnc = RFBConnection(host, port, password)
+    try:
+        vnc.connect()
+        sys.stderr.write(f"VNC: {vnc.name} {vnc.width}x{vnc.height} bpp={vnc.bpp}\n")
+        framebuffer = vnc.read_framebuffer()
+    finally:
+        vnc.close()
 
-        img = Image.frombytes('RGBA', (width, height), bytes(rgba_data))
+    width, height = vnc.width, vnc.height
 
+    # Convert BGRX framebuffer to PNG
+    img = framebuffer_to_image(framebuffer, width, height)
+    if img is not None:
         if output_file and output_file != '-b64':
-            img.save(output_file, 'PNG')
+            save_image(img, output_file, output_file)
             print(f"OK:{width}x{height}")
         else:
-            buf = io.BytesIO()
-            img.save(buf, 'PNG')
-            b64 = base64.b64encode(buf.getvalue()).decode('ascii')
-            print(b64)
+            # Stream the PNG through base64 straight to stdout instead of
+            # holding both the PNG and its base64 copy in memory
+            out = sys.stdout.buffer
+            writer = Base64Writer(out)
+            save_image(img, writer)
+            writer.finish()
+            out.write(b'\n')
+            out.flush()
     else:
         # Without PIL, output raw base64 of BMP-ish data
         sys.stderr.write("Warning: PIL not available, outputting raw BGRA data\n")
-        b64 = base64.b64encode(bytes(framebuffer)).decode('ascii')
+        b64 = base64.b64encode(framebuffer).decode('ascii')
         print(b64)
 
     return width, height
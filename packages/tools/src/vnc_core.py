@@ -0,0 +1,613 @@
+"""
+VNC Core - shared RFB client used by vnc-control.py and vnc-screenshot.py.
+Uses RFB protocol 3.8 with VNCAuth (type 2) or no auth (type 1).
+
+PIL and numpy are imported lazily, only when a framebuffer is captured,
+so input-only actions (click, type, key...) start fast.
+"""
+
+import os
+import sys
+import socket
+import struct
+import functools
+import zlib
+
+# Precompiled RFB wire formats
+_U8 = struct.Struct('B')
+_U16BE = struct.Struct('>H')
+_U32BE = struct.Struct('>I')
+_S32BE = struct.Struct('>i')
+# ServerInit: width, height, pixel format (16 bytes), name length
+_SERVER_INIT = struct.Struct('>HHBBBBHHHBBB3xI')
+_PIXEL_FORMAT = struct.Struct('>BBBBHHHBBBxxx')
+_SET_PIXEL_FORMAT = struct.Struct('>Bxxx')
+_SET_ENCODINGS = struct.Struct('>BxH')
+_FB_UPDATE_REQUEST = struct.Struct('>BBHHHH')
+_RECT_HDR = struct.Struct('>HHHHi')
+
+# SetPixelFormat bodies for the framebuffer formats we can request, by bpp.
+# Fields: bpp, depth, big-endian, true color, r/g/b max, r/g/b shift
+_PIXEL_FORMATS = {
+    32: _PIXEL_FORMAT.pack(32, 24, 0, 1, 255, 255, 255, 16, 8, 0),  # BGRX
+    16: _PIXEL_FORMAT.pack(16, 16, 0, 1, 31, 63, 31, 11, 5, 0),     # RGB565, little-endian
+}
+
+# PIL raw decoder mode for each of those formats
+_PIL_RAWMODES = {32: 'BGRX', 16: 'BGR;16'}
+
+# Encodings we can decode, most compact first
+_ENCODING_RAW = 0
+_ENCODING_HEXTILE = 5
+_ENCODING_ZRLE = 16
+_ENCODINGS = (_ENCODING_ZRLE, _ENCODING_HEXTILE, _ENCODING_RAW)
+
+# Raw is asked for first by default: on loopback or a LAN, decoding ZRLE costs
+# far more than the bytes it saves. JARVIS_VNC_ENCODING=zrle or hextile puts
+# that encoding first instead, for slow links.
+_ENCODING_NAMES = {'raw': _ENCODING_RAW, 'hextile': _ENCODING_HEXTILE, 'zrle': _ENCODING_ZRLE}
+
+# Hextile tile subencoding flags
+_HEXTILE_RAW = 1
+_HEXTILE_BACKGROUND = 2
+_HEXTILE_FOREGROUND = 4
+_HEXTILE_ANY_SUBRECTS = 8
+_HEXTILE_SUBRECTS_COLOURED = 16
+
+# ZRLE packed-palette rows: byte -> palette indices, most significant bits first
+_PACKED_INDICES = {
+    bits: [
+        tuple((b >> (8 - bits * (k + 1))) & ((1 << bits) - 1) for k in range(8 // bits))
+        for b in range(256)
+    ]
+    for bits in (1, 2, 4)
+}
+
+# Receive buffer sized for multi-MB framebuffer updates (1080p Raw is ~8 MB)
+_RCVBUF_SIZE = 4 * 1024 * 1024
+
+# Per-connection read-ahead buffer for small protocol fields
+_RX_BUFFER_SIZE = 256 << 10
+
+# How far past the requested bytes a buffered read may go. Kept small so bulk
+# pixel data stays in the socket for recv_into_exact to place directly.
+_READ_AHEAD = 64 << 10
+
+# zlib level for PNG screenshots. They are read by an LLM or a control loop,
+# which gains nothing from maximum compression, and level 6 (PIL's default)
+# can cost more CPU than the whole VNC transfer. Override with
+# JARVIS_VNC_PNG_COMPRESS_LEVEL (0-9).
+PNG_COMPRESS_LEVEL = 1
+
+# VNC reverses the bits in each byte of the DES key; precompute the mapping
+_BITREV = bytes(int('{:08b}'.format(i)[::-1], 2) for i in range(256))
+
+
+# DES encryption for VNC auth
+@functools.lru_cache(maxsize=4)
+def _vnc_des_cipher(key_bytes):
+    """ECB is stateless, so one cipher per key can be reused across blocks."""
+    try:
+        from Crypto.Cipher import DES
+    except ImportError:
+        try:
+            from Cryptodome.Cipher import DES
+        except ImportError:
+            raise ImportError("Need pycryptodome: pip3 install pycryptodome")
+
+    return DES.new(key_bytes.translate(_BITREV), DES.MODE_ECB)
+
+
+def vnc_des_encrypt(key_bytes, challenge):
+    """VNC uses a modified DES where bits in each byte are reversed."""
+    return _vnc_des_cipher(key_bytes).encrypt(challenge)
+
+
+def _preferred_encodings():
+    """Encodings to advertise: the JARVIS_VNC_ENCODING choice (default raw), then the rest."""
+    name = os.environ.get('JARVIS_VNC_ENCODING', 'raw').strip().lower()
+    first = _ENCODING_NAMES.get(name, _ENCODING_RAW)
+    return (first,) + tuple(e for e in _ENCODINGS if e != first)
+
+
+def framebuffer_to_image(framebuffer, width, height, bpp=32):
+    """Wrap a BGRX or RGB565 framebuffer as a PIL RGB image, or None without PIL."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    # Let PIL's raw decoder unpack the pixels directly (drops BGRX padding,
+    # expands 565 to 888)
+    return Image.frombuffer('RGB', (width, height), framebuffer, 'raw', _PIL_RAWMODES[bpp], 0, 1)
+
+
+def _png_compress_level():
+    """PNG zlib level from JARVIS_VNC_PNG_COMPRESS_LEVEL, clamped to 0-9."""
+    try:
+        level = int(os.environ.get('JARVIS_VNC_PNG_COMPRESS_LEVEL', PNG_COMPRESS_LEVEL))
+    except ValueError:
+        return PNG_COMPRESS_LEVEL
+    return min(max(level, 0), 9)
+
+
+def save_image(img, fp, filename=None):
+    """Save a screenshot: JPEG for .jpg/.jpeg filenames, fast PNG otherwise."""
+    if filename and filename.lower().endswith(('.jpg', '.jpeg')):
+        img.save(fp, 'JPEG', quality=85)
+    else:
+        img.save(fp, 'PNG', compress_level=_png_compress_level())
+
+
+def _cpixels_to_bgrx(cpixels):
+    """Expand 3-byte ZRLE CPIXELs to 4-byte BGRX pixels without a Python loop."""
+    out = bytearray(len(cpixels) // 3 * 4)
+    out[0::4] = cpixels[0::3]
+    out[1::4] = cpixels[1::3]
+    out[2::4] = cpixels[2::3]
+    return out
+
+
+def _zrle_palette(data, pos, size, cpixel_size, pad):
+    """Read a ZRLE tile palette, returned as a list of framebuffer pixels."""
+    end = pos + size * cpixel_size
+    palette = [data[i:i + cpixel_size] + pad for i in range(pos, end, cpixel_size)]
+    return palette, end
+
+
+def _zrle_run_length(data, pos):
+    """Decode a ZRLE run length: bytes summed until one is not 255, plus one."""
+    run = 1
+    while data[pos] == 255:
+        run += 255
+        pos += 1
+    return run + data[pos], pos + 1
+
+
+def _zrle_palette_array(np, buf, pos, size, cpixel_size, pixel_size):
+    """Read a ZRLE tile palette as a (size, pixel_size) uint8 array."""
+    end = pos + size * cpixel_size
+    palette = np.zeros((size, pixel_size), dtype=np.uint8)
+    palette[:, :cpixel_size] = buf[pos:end].reshape(size, cpixel_size)
+    return palette, end
+
+
+def _zrle_unpack_indices(np, buf, pos, bits, tw, th):
+    """Unpack th rows of packed palette indices into a (th, tw) array."""
+    row_len = (tw * bits + 7) // 8
+    end = pos + row_len * th
+    packed = buf[pos:end].reshape(th, row_len)
+    # Most significant bits first within each byte
+    shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+    indices = (packed[:, :, None] >> shifts) & ((1 << bits) - 1)
+    return indices.reshape(th, -1)[:, :tw], end
+
+
+def _zrle_rle_runs(np, buf, pos, num_pixels, cpixel_size):
+    """Parse a plain RLE tile into (CPIXEL offsets, run lengths, end position).
+
+    Runs of up to 255 pixels have a one-byte length, so those tokens sit
+    at a fixed stride and are parsed in bulk; only longer runs, whose lengths
+    continue over 255 bytes, are walked one at a time.
+    """
+    stride = cpixel_size + 1
+    offsets = []
+    runs = []
+    while num_pixels > 0:
+        lengths = buf[pos + cpixel_size:pos + cpixel_size + stride * num_pixels:stride]
+        long_runs = np.flatnonzero(lengths == 255)
+        count = long_runs[0] if long_runs.size else lengths.size
+        seg_runs = lengths[:count].astype(np.intp) + 1
+        covered = np.cumsum(seg_runs)
+        # Stop at the token that completes the tile
+        done = np.searchsorted(covered, num_pixels)
+        if done < count:
+            count = done + 1
+        offsets.append(pos + stride * np.arange(count))
+        runs.append(seg_runs[:count])
+        pos += stride * count
+        num_pixels -= int(covered[count - 1]) if count else 0
+        if num_pixels > 0 and long_runs.size and count == long_runs[0]:
+            run, next_pos = _zrle_run_length(buf.data, pos + cpixel_size)
+            offsets.append(np.array([pos]))
+            runs.append(np.array([run]))
+            num_pixels -= run
+            pos = next_pos
+        elif num_pixels > 0:
+            raise Exception("Truncated ZRLE RLE tile")
+    return np.concatenate(offsets), np.concatenate(runs), pos
+
+
+def _zrle_palette_rle_runs(np, buf, pos, num_pixels):
+    """Parse a palette RLE tile into (palette indices, run lengths, end position).
+
+    Each token is an index byte, followed by a run length when its top bit
+    is set. 255 only ever continues a run length (palette indices stop at
+    126), so once those are dropped every token is one or two bytes, and
+    token boundaries can be found with array operations.
+    """
+    # A tile can't take more than two bytes per pixel plus its 255s
+    window = buf[pos:pos + 2 * num_pixels + num_pixels // 255 + 2]
+    kept = np.flatnonzero(window != 255)
+    values = window[kept]
+    flagged = values >= 128
+    # In a stretch of flagged bytes, tokens start at every other byte and the
+    # bytes between them end run lengths; so does the byte after a stretch
+    # whose last byte started a token
+    positions = np.arange(len(values))
+    stretch_start = np.maximum.accumulate(np.where(flagged, 0, positions + 1))
+    ends_run = np.zeros(len(values), dtype=bool)
+    ends_run[1:] = flagged[:-1] & ((positions[:-1] - stretch_start[:-1]) & 1 == 0)
+    starts = np.flatnonzero(~ends_run)
+
+    # Run length: 1, or for flagged tokens 1 + the final byte + 255 per 255 byte
+    nxt = np.minimum(starts + 1, len(values) - 1)
+    is_run = flagged[starts]
+    runs = np.where(is_run, 1 + values[nxt].astype(np.intp) + 255 * (kept[nxt] - kept[starts] - 1), 1)
+    covered = np.cumsum(runs)
+    count = np.searchsorted(covered, num_pixels) + 1
+    if count > len(starts) or covered[count - 1] != num_pixels:
+        raise Exception("Invalid ZRLE palette RLE tile")
+    last = starts[count - 1] + (1 if is_run[count - 1] else 0)
+    return values[starts[:count]] & 0x7f, runs[:count], pos + int(kept[last]) + 1
+
+
+class RFBConnection:
+    def __init__(self, host, port, password):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.sock = None
+        self.width = 0
+        self.height = 0
+        self.bpp = 0
+        self.name = ''
+        # Read-ahead buffer: bytes in [_rx_start, _rx_end) are received but unread
+        self._rxbuf = bytearray(_RX_BUFFER_SIZE)
+        self._rxview = memoryview(self._rxbuf)
+        self._rx_start = 0
+        self._rx_end = 0
+        self._zrle_inflater = None
+        # Grown on demand and reused for every rect's payload
+        self._rect_scratch = bytearray(0)
+
+    def connect(self):
+        """Open the socket and run the RFB handshake up to ServerInit."""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.settimeout(15)
+        # Set before connect so the larger window is advertised in the handshake
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _RCVBUF_SIZE)
+        self.sock.connect((self.host, self.port))
+        # Handshake and input events are tiny writes; don't let Nagle hold them back
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        # 1. Protocol version handshake
+        server_version = bytes(self._read(12))
+        # Send our version (3.8)
+        self.sock.sendall(b'RFB 003.008\n')
+
+        # 2. Security types
+        num_types = _U8.unpack_from(self._read(1), 0)[0]
+        if num_types == 0:
+            err_len = _U32BE.unpack_from(self._read(4), 0)[0]
+            err_msg = bytes(self._read(err_len)).decode('utf-8', errors='replace')
+            raise Exception(f"VNC error: {err_msg}")
+
+        security_types = list(self._read(num_types))
+
+        # Prefer VNCAuth (type 2)
+        if 2 in security_types:
+            self.sock.sendall(_U8.pack(2))
+            challenge = bytes(self._read(16))
+            # Pad/truncate password to 8 bytes
+            key = (self.password.encode('utf-8') + b'\x00' * 8)[:8]
+            response = vnc_des_encrypt(key, challenge[:8]) + vnc_des_encrypt(key, challenge[8:16])
+            self.sock.sendall(response)
+            auth_result = _U32BE.unpack_from(self._read(4), 0)[0]
+            if auth_result != 0:
+                raise Exception(f"VNC authentication failed (result: {auth_result})")
+        elif 1 in security_types:
+            # No auth
+            self.sock.sendall(_U8.pack(1))
+        else:
+            raise Exception(f"No supported security type (offered: {security_types})")
+
+        # 3. Client init (shared flag = 1)
+        self.sock.sendall(_U8.pack(1))
+
+        # 4. Server init
+        (self.width, self.height, self.bpp, depth, big_endian, true_color,
+         r_max, g_max, b_max, r_shift, g_shift, b_shift,
+         name_len) = _SERVER_INIT.unpack_from(self._read(_SERVER_INIT.size), 0)
+        self.name = bytes(self._read(name_len)).decode('utf-8', errors='replace')
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+
+    def _read(self, n):
+        """Return a view of the next n bytes, valid only until the next read."""
+        if n > len(self._rxbuf):
+            return memoryview(self.recv_exact(n))
+        if self._rx_end - self._rx_start < n:
+            self._fill(n)
+        start = self._rx_start
+        self._rx_start = start + n
+        return self._rxview[start:start + n]
+
+    def _fill(self, n):
+        """Receive into the read-ahead buffer until at least n bytes are unread."""
+        pending = self._rx_end - self._rx_start
+        if self._rx_start + n > len(self._rxbuf):
+            # Not enough room at the tail: move the unread bytes to the front
+            self._rxbuf[:pending] = self._rxbuf[self._rx_start:self._rx_end]
+            self._rx_start, self._rx_end = 0, pending
+        limit = min(len(self._rxbuf), self._rx_start + n + _READ_AHEAD)
+        while self._rx_end - self._rx_start < n:
+            got = self.sock.recv_into(self._rxview[self._rx_end:limit])
+            if not got:
+                raise Exception("Connection closed")
+            self._rx_end += got
+
+    def recv_into_exact(self, view):
+        # Fill the target buffer in place instead of growing bytes (O(n^2) copies)
+        n = len(view)
+        # Drain whatever the read-ahead buffer already holds first
+        received = min(n, self._rx_end - self._rx_start)
+        if received:
+            view[:received] = self._rxview[self._rx_start:self._rx_start + received]
+            self._rx_start += received
+        while received < n:
+            got = self.sock.recv_into(view[received:], n - received)
+            if not got:
+                raise Exception("Connection closed")
+            received += got
+
+    def _scratch(self, n):
+        """Return an n-byte view of the reusable rect buffer, growing it if needed."""
+        if len(self._rect_scratch) < n:
+            self._rect_scratch = bytearray(n)
+        return memoryview(self._rect_scratch)[:n]
+
+    def recv_exact(self, n):
+        data = bytearray(n)
+        self.recv_into_exact(memoryview(data))
+        return data
+
+    def read_framebuffer(self, bpp=32):
+        """Request a full update and return it as a bytearray of pixels.
+
+        bpp=32 gives BGRX; bpp=16 gives little-endian RGB565, which halves
+        the bytes on the wire at the cost of colour depth.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+
+        # SetPixelFormat + SetEncodings + full FramebufferUpdateRequest,
+        # batched into a single write
+        encodings = _preferred_encodings()
+        self.sock.sendall(b''.join((
+            _SET_PIXEL_FORMAT.pack(0), _PIXEL_FORMATS[bpp],
+            _SET_ENCODINGS.pack(2, len(encodings)),
+            b''.join(_S32BE.pack(e) for e in encodings),
+            _FB_UPDATE_REQUEST.pack(3, 0, 0, 0, self.width, self.height),
+        )))
+
+        canvas = _Canvas(self.width, self.height, bpp // 8, np)
+
+        while True:
+            msg_type = _U8.unpack_from(self._read(1), 0)[0]
+
+            if msg_type == 0:  # FramebufferUpdate
+                num_rects = _U16BE.unpack_from(self._read(3), 1)[0]  # skip padding
+
+                for _ in range(num_rects):
+                    rx, ry, rw, rh, encoding = _RECT_HDR.unpack_from(self._read(12), 0)
+
+                    if encoding == _ENCODING_RAW:
+                        self._decode_raw(canvas, rx, ry, rw, rh)
+                    elif encoding == _ENCODING_ZRLE:
+                        self._decode_zrle(canvas, rx, ry, rw, rh)
+                    elif encoding == _ENCODING_HEXTILE:
+                        self._decode_hextile(canvas, rx, ry, rw, rh)
+                    else:
+                        sys.stderr.write(f"Unsupported encoding: {encoding}\n")
+                        break
+
+                break  # Got the framebuffer
+
+            elif msg_type == 1:  # SetColorMapEntries
+                header = self._read(5)  # padding, first color, number of colors
+                first_color = _U16BE.unpack_from(header, 1)[0]
+                num_colors = _U16BE.unpack_from(header, 3)[0]
+                _ = self.recv_exact(num_colors * 6)  # RGB values
+
+            elif msg_type == 2:  # Bell
+                pass
+
+            elif msg_type == 3:  # ServerCutText
+                text_len = _U32BE.unpack_from(self._read(7), 3)[0]  # skip padding
+                _ = self.recv_exact(text_len)
+
+            else:
+                sys.stderr.write(f"Unknown message type: {msg_type}\n")
+                break
+
+        return canvas.data
+
+    def _decode_raw(self, canvas, rx, ry, rw, rh):
+        row_bytes = rw * canvas.pixel_size
+        if rx == 0 and rw == canvas.width:
+            # Full-width rows are contiguous: receive straight into the framebuffer
+            dst_start = ry * row_bytes
+            self.recv_into_exact(canvas.view[dst_start:dst_start + rh * row_bytes])
+        else:
+            rect_view = self._scratch(rh * row_bytes)
+            self.recv_into_exact(rect_view)
+            canvas.paste(rx, ry, rw, rh, rect_view)
+
+    def _decode_hextile(self, canvas, rx, ry, rw, rh):
+        """Hextile: 16x16 tiles of background fill plus optional subrects."""
+        pixel_size = canvas.pixel_size
+        background = foreground = b'\x00' * pixel_size
+        for ty in range(ry, ry + rh, 16):
+            th = min(16, ry + rh - ty)
+            for tx in range(rx, rx + rw, 16):
+                tw = min(16, rx + rw - tx)
+                mask = self._read(1)[0]
+
+                if mask & _HEXTILE_RAW:
+                    canvas.paste(tx, ty, tw, th, self._read(tw * th * pixel_size))
+                    continue
+
+                # Background/foreground carry over from the previous tile
+                if mask & _HEXTILE_BACKGROUND:
+                    background = bytes(self._read(pixel_size))
+                if mask & _HEXTILE_FOREGROUND:
+                    foreground = bytes(self._read(pixel_size))
+                canvas.fill(tx, ty, tw, th, background)
+
+                if mask & _HEXTILE_ANY_SUBRECTS:
+                    count = self._read(1)[0]
+                    coloured = mask & _HEXTILE_SUBRECTS_COLOURED
+                    subrects = bytes(self._read(count * (pixel_size + 2 if coloured else 2)))
+                    pos = 0
+                    for _ in range(count):
+                        if coloured:
+                            foreground = subrects[pos:pos + pixel_size]
+                            pos += pixel_size
+                        xy, wh = subrects[pos], subrects[pos + 1]
+                        pos += 2
+                        canvas.fill(tx + (xy >> 4), ty + (xy & 15), (wh >> 4) + 1, (wh & 15) + 1, foreground)
+
+    def _decode_zrle(self, canvas, rx, ry, rw, rh):
+        """ZRLE: zlib-compressed 64x64 tiles of CPIXELs."""
+        # 32bpp BGRX travels as 3-byte CPIXELs (B, G, R); 16bpp pixels are sent whole
+        pixel_size = canvas.pixel_size
+        cpixel_size = 3 if pixel_size == 4 else pixel_size
+        pad = b'\x00' * (pixel_size - cpixel_size)
+        length = _U32BE.unpack_from(self._read(4), 0)[0]
+        if self._zrle_inflater is None:
+            # One zlib stream spans every ZRLE rect on the connection
+            self._zrle_inflater = zlib.decompressobj()
+        compressed = self._scratch(length)
+        self.recv_into_exact(compressed)
+        data = self._zrle_inflater.decompress(compressed)
+        # With numpy, palette and RLE tiles are expanded as arrays rather than per pixel
+        np = canvas.np
+        buf = np.frombuffer(data, dtype=np.uint8) if np is not None else None
+
+        pos = 0
+        for ty in range(ry, ry + rh, 64):
+            th = min(64, ry + rh - ty)
+            for tx in range(rx, rx + rw, 64):
+                tw = min(64, rx + rw - tx)
+                subencoding = data[pos]
+                pos += 1
+
+                if subencoding == 0:  # Raw CPIXELs
+                    end = pos + tw * th * cpixel_size
+                    pixels = _cpixels_to_bgrx(data[pos:end]) if pad else data[pos:end]
+                    canvas.paste(tx, ty, tw, th, pixels)
+                    pos = end
+
+                elif subencoding == 1:  # Solid tile
+                    canvas.fill(tx, ty, tw, th, data[pos:pos + cpixel_size] + pad)
+                    pos += cpixel_size
+
+                elif subencoding <= 16:  # Packed palette indices
+                    bits = 1 if subencoding == 2 else 2 if subencoding <= 4 else 4
+                    if np is not None:
+                        palette, pos = _zrle_palette_array(np, buf, pos, subencoding, cpixel_size, pixel_size)
+                        indices, pos = _zrle_unpack_indices(np, buf, pos, bits, tw, th)
+                        canvas.paste(tx, ty, tw, th, palette[indices])
+                        continue
+                    palette, pos = _zrle_palette(data, pos, subencoding, cpixel_size, pad)
+                    unpack = _PACKED_INDICES[bits]
+                    row_len = (tw * bits + 7) // 8
+                    pieces = []
+                    for _ in range(th):
+                        indices = []
+                        for byte in data[pos:pos + row_len]:
+                            indices.extend(unpack[byte])
+                        pieces.extend(palette[i] for i in indices[:tw])
+                        pos += row_len
+                    canvas.paste(tx, ty, tw, th, b''.join(pieces))
+
+                elif subencoding == 128:  # Plain RLE
+                    if np is not None:
+                        offsets, runs, pos = _zrle_rle_runs(np, buf, pos, tw * th, cpixel_size)
+                        pixels = np.zeros((len(offsets), pixel_size), dtype=np.uint8)
+                        pixels[:, :cpixel_size] = buf[offsets[:, None] + np.arange(cpixel_size)]
+                        canvas.paste(tx, ty, tw, th, np.repeat(pixels, runs, axis=0))
+                        continue
+                    pieces = []
+                    remaining = tw * th
+                    while remaining > 0:
+                        pixel = data[pos:pos + cpixel_size] + pad
+                        run, pos = _zrle_run_length(data, pos + cpixel_size)
+                        pieces.append(pixel * run)
+                        remaining -= run
+                    canvas.paste(tx, ty, tw, th, b''.join(pieces))
+
+                elif subencoding >= 130:  # Palette RLE
+                    if np is not None:
+                        palette, pos = _zrle_palette_array(np, buf, pos, subencoding - 128, cpixel_size, pixel_size)
+                        indices, runs, pos = _zrle_palette_rle_runs(np, buf, pos, tw * th)
+                        canvas.paste(tx, ty, tw, th, np.repeat(palette[indices], runs, axis=0))
+                        continue
+                    palette, pos = _zrle_palette(data, pos, subencoding - 128, cpixel_size, pad)
+                    pieces = []
+                    remaining = tw * th
+                    while remaining > 0:
+                        index = data[pos]
+                        if index & 0x80:
+                            run, pos = _zrle_run_length(data, pos + 1)
+                        else:
+                            run, pos = 1, pos + 1
+                        pieces.append(palette[index & 0x7f] * run)
+                        remaining -= run
+                    canvas.paste(tx, ty, tw, th, b''.join(pieces))
+
+                else:
+                    raise Exception(f"Invalid ZRLE subencoding: {subencoding}")
+
+
+class _Canvas:
+    """Framebuffer (pixel_size bytes per pixel) that the rect decoders paint into."""
+
+    def __init__(self, width, height, pixel_size=4, np=None):
+        self.width = width
+        self.height = height
+        self.pixel_size = pixel_size
+        self.data = bytearray(width * height * pixel_size)
+        self.view = memoryview(self.data)
+        self.np = np
+        self.pixels = None
+        if np is not None:
+            self.pixels = np.frombuffer(self.data, dtype=np.uint8).reshape(height, width, pixel_size)
+
+    def paste(self, x, y, w, h, data):
+        """Copy w*h pixels into the rect at (x, y)."""
+        if self.pixels is not None:
+            # One strided 2D copy for the whole rect
+            rect_pixels = self.np.frombuffer(data, dtype=self.np.uint8).reshape(h, w, self.pixel_size)
+            self.pixels[y:y + h, x:x + w] = rect_pixels
+            return
+        # Copy rect data into framebuffer row by row
+        row_bytes = w * self.pixel_size
+        for row in range(h):
+            src_off = row * row_bytes
+            dst_off = ((y + row) * self.width + x) * self.pixel_size
+            self.view[dst_off:dst_off + row_bytes] = data[src_off:src_off + row_bytes]
+
+    def fill(self, x, y, w, h, pixel):
+        """Fill the rect at (x, y) with a single pixel value."""
+        if self.pixels is not None:
+            self.pixels[y:y + h, x:x + w] = self.np.frombuffer(pixel, dtype=self.np.uint8)
+            return
+        row = pixel * w
+        for r in range(h):
+            dst_off = ((y + r) * self.width + x) * self.pixel_size
+            self.view[dst_off:dst_off + len(row)] = row